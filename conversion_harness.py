@@ -0,0 +1,256 @@
+"""Equivalence and performance harness for the conversion engines.
+
+Generates randomized templates and checks that every registered engine
+produces byte-identical output to the frozen reference implementation in
+reference_converter.py, timing each engine as it goes. Register a faster
+path in CONVERT_ENGINES or PREVIEW_ENGINES and run this before enabling it.
+
+    python conversion_harness.py --cases 500 --seed 0
+
+Timings are compared as ratios to the reference engine of the same stage (the
+revert stage, which has none, to the forward conversion reference), so a
+baseline saved with --save-baseline on one machine can be checked with
+--baseline on another.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import reference_converter
+import stl_converter
+
+# Engines that turn old framework HTML into Theme Smith HTML
+CONVERT_ENGINES = {
+    'reference': reference_converter.convert_tags,
+    'stl_converter': stl_converter.convert_tags,
+    'stl_converter_provenance': lambda html: stl_converter.convert_tags_with_provenance(html)[0],
+}
+
+# Engines that render Theme Smith HTML into a preview
+PREVIEW_ENGINES = {
+    'reference': lambda html: reference_converter.replace_stl_content_tags_with_samples(
+        reference_converter.replace_theme_props_with_values(html)
+    ),
+    'stl_converter': lambda html: stl_converter.replace_stl_content_tags_with_samples(
+        stl_converter.replace_theme_props_with_values(html)
+    ),
+}
+
+SELECTORS = ['.arrow', '.arrow-text', '.title', '.ad-title', '.cta', '.header', '.x', 'body', '#main']
+CSS_PROPERTIES = ['color', 'background-color', 'border-color', 'border-bottom-color', 'font-size', 'font-family']
+UNMAPPED_NAMES = ['FooBar', 'HeaderArea', 'CMNewThing', 'relcont', 'XMLBox', 'aB']
+UNMAPPED_TYPES = ['color', 'font-size', 'font-family', 'textCase', 'checkbox']
+# Characters the tag patterns accept in names and types but that break a
+# generated theme_prop name: whitespace, '>', '<', '=', '&', non-ASCII
+UNUSUAL_NAMES = ['Foo Bar', 'Ad>Box', 'a<b', 'k=v', 'R&D', 'Ünïcode', 'Tab\tName', 'Line\nBreak', '__Lead', '9Lives']
+UNUSUAL_TYPES = ['font size', 'color>', 'back-ground', 'ÇOLOR']
+VALUES = ['#fff', '#1a2b3c', 'red', 'rgb(1, 2, 3)', '12px', 'Arial, sans-serif', '', 'uppercase', '1', 'a > b', '</style>']
+STL_CONTENT_TAGS = [
+    '<if:ad_present1>', '</if:ad_present1>', '<tag:ad_annotation_enabled1 />',
+    '<customtag:adClickUrl2 data-type="title" />', '<tag:page_title />', '<tag:charset />',
+    '<tag:ad_sldtld1 />', '<ad_title_text:1 />', '<ad_desc:2 />', '<ad_href_url:1 />',
+    '<web_title_text:3 />', '<web_desc:3 />', '<web_href_url:3 />', '<footer_links />',
+    '<tag:post_form_html />', '<tag:jssource />',
+]
+
+def random_tagd_style(rng, names):
+    """Build one <tagd:style> tag with random attribute order, quoting and spacing"""
+    choice = rng.random()
+    if choice < 0.65:
+        name, type = rng.choice(list(reference_converter.TAG_MAPPING)).split('_', 1)
+    elif choice < 0.9:
+        name, type = rng.choice(UNMAPPED_NAMES), rng.choice(UNMAPPED_TYPES)
+    else:
+        name, type = rng.choice(UNUSUAL_NAMES), rng.choice(UNMAPPED_TYPES + UNUSUAL_TYPES)
+    if names and rng.random() < 0.4:
+        name, type = rng.choice(names)  # Force duplicates
+    names.append((name, type))
+
+    value = rng.choice(VALUES)
+    quote = rng.choice(['"', "'"])
+    open_quote = rng.choice(['"', quote])  # Mixed quoting is accepted by the tag patterns
+    attrs = {
+        'name': f'name={quote}{name}{quote}',
+        'value': f'value={open_quote}{value}{quote}',
+        'type': f'type={quote}{type}{quote}',
+    }
+    order = rng.choice([('name', 'value', 'type'), ('type', 'name', 'value'), ('value', 'name', 'type')])
+    spacing = rng.choice([' ', '  ', '\n    ', '\t'])
+    closing = rng.choice(['/>', ' />', '  />'])
+    tag_name = rng.choice(['tagd:style', 'TAGD:style', 'tagd:Style'])
+    return f'<{tag_name}{spacing}' + spacing.join(attrs[key] for key in order) + closing
+
+def random_rule(rng, names, depth):
+    """Build a CSS rule, optionally nested inside @media blocks"""
+    declarations = []
+    for _ in range(rng.randint(1, 4)):
+        declarations.append(f'{rng.choice(CSS_PROPERTIES)}: {random_tagd_style(rng, names)};')
+    rule = f'{rng.choice(SELECTORS)} {{ ' + rng.choice([' ', '\n  ']).join(declarations) + ' }'
+    if depth and rng.random() < 0.5:
+        inner = '\n'.join(random_rule(rng, names, depth - 1) for _ in range(rng.randint(1, 3)))
+        return f'@media (min-width: {rng.choice([480, 768, 1024])}px) {{\n{inner}\n}}'
+    return rule
+
+def random_template(rng):
+    """Build a randomized old framework template"""
+    names = []
+    parts = ['<html><head><style>']
+    for _ in range(rng.randint(1, 8)):
+        parts.append(random_rule(rng, names, depth=2))
+    parts.append('</style></head><body>')
+    for _ in range(rng.randint(0, 10)):
+        choice = rng.random()
+        if choice < 0.4:
+            parts.append(random_tagd_style(rng, names))
+        elif choice < 0.6:
+            parts.append(rng.choice(STL_CONTENT_TAGS))
+        elif choice < 0.7:
+            parts.append(f'<theme_prop:existing_prop default="{rng.choice(VALUES)}" />')
+        elif choice < 0.8:
+            parts.append(f'<tagd:style name="Body{rng.randint(1, 3)}" value="Some text" type="content" />')
+        else:
+            parts.append(f'<div class="{rng.choice(SELECTORS).lstrip(".#")}">text</div>')
+    parts.append('</body></html>')
+    return rng.choice(['\n', '\n\n', ' ', '']).join(parts)
+
+def first_difference(expected, actual):
+    """Describe where two outputs start to differ"""
+    for index, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            break
+    else:
+        index = min(len(expected), len(actual))
+    return f"offset {index}: expected {expected[index:index + 60]!r}, got {actual[index:index + 60]!r}"
+
+def expected_revert(html, provenance):
+    """Return what reverting the conversion of html should give
+
+    The forward cleanup collapses line breaks around <tag:...> tags, and
+    tags reported by unrecoverable_tags stay in their converted form.
+    """
+    cursor = 0
+    for record in stl_converter.unrecoverable_tags(provenance):
+        index = html.index(record['original'], cursor)
+        html = html[:index] + record['converted'] + html[index + len(record['original']):]
+        cursor = index + len(record['converted'])
+    html = stl_converter.TAG_LINE_BREAKS_RE.sub(r' \1 ', html)
+    return stl_converter.TAG_TRAILING_BREAK_RE.sub(r'\1 ', html)
+
+def run_engines(engines, inputs, timings, failures, label):
+    """Run every engine over inputs, comparing against the reference and accumulating timings"""
+    for case, html in inputs:
+        expected = None
+        for name, engine in engines.items():
+            start = time.perf_counter()
+            try:
+                output = engine(html)
+            except Exception as e:
+                failures.append(f"[{label}] case {case}, engine {name}: raised {type(e).__name__}: {e}")
+                continue
+            finally:
+                timings[(label, name)] = timings.get((label, name), 0.0) + time.perf_counter() - start
+            if name == 'reference':
+                expected = output.encode('utf-8')
+            elif expected is not None and output.encode('utf-8') != expected:
+                failures.append(f"[{label}] case {case}, engine {name}: "
+                                f"{first_difference(expected.decode('utf-8'), output)}")
+
+def run(cases, seed, repeat=1):
+    """Generate cases from seed and check every engine; return (timings, failures)"""
+    rng = random.Random(seed)
+    templates = [(case, random_template(rng)) for case in range(cases)]
+    # Larger inputs expose quadratic behaviour in the duplicate renaming
+    templates.append(('bulk', '\n'.join(html for _, html in templates[:50])))
+
+    timings = {}
+    failures = []
+    for _ in range(repeat):
+        run_engines(CONVERT_ENGINES, templates, timings, failures, 'convert')
+    converted = [(case, reference_converter.convert_tags(html)) for case, html in templates]
+    for _ in range(repeat):
+        run_engines(PREVIEW_ENGINES, converted, timings, failures, 'preview')
+
+    # Reverting with provenance must restore the input
+    for case, html in templates:
+        try:
+            output, provenance = stl_converter.convert_tags_with_provenance(html)
+            start = time.perf_counter()
+            reverted = stl_converter.revert_tags(output, provenance)
+            timings[('revert', 'stl_converter')] = timings.get(('revert', 'stl_converter'), 0.0) + time.perf_counter() - start
+            expected = expected_revert(html, provenance)
+        except Exception as e:
+            failures.append(f"[revert] case {case}: raised {type(e).__name__}: {e}")
+            continue
+        if reverted != expected:
+            failures.append(f"[revert] case {case}: {first_difference(expected, reverted)}")
+
+    return timings, failures
+
+def reference_stage(label, timings):
+    """Return the stage whose reference engine an engine in label is timed against
+
+    The revert stage has no reference engine, so it is measured against the
+    forward conversion reference.
+    """
+    return label if (label, 'reference') in timings else 'convert'
+
+def timing_ratios(timings):
+    """Express each engine's time as a multiple of a reference engine
+
+    Keys name both sides, e.g. 'revert/stl_converter vs convert/reference'.
+    """
+    ratios = {}
+    for (label, name), seconds in timings.items():
+        stage = reference_stage(label, timings)
+        ratios[f'{label}/{name} vs {stage}/reference'] = seconds / timings[(stage, 'reference')]
+    return ratios
+
+def compare_to_baseline(ratios, baseline, tolerance):
+    """Return a failure for every engine slower than its baseline ratio by more than tolerance"""
+    failures = []
+    for key, ratio in ratios.items():
+        if key in baseline and ratio > baseline[key] * (1 + tolerance):
+            failures.append(f"[timing] {key}: {ratio:.2f}x, baseline {baseline[key]:.2f}x "
+                            f"(tolerance {tolerance:.0%})")
+    return failures
+
+def main(argv=None):
+    """Run the harness and report timings; exit non-zero on any mismatch"""
+    parser = argparse.ArgumentParser(description="Check conversion engines against the reference implementation.")
+    parser.add_argument('--cases', type=int, default=200, help="number of random templates")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, reuse it to reproduce a failure")
+    parser.add_argument('--repeat', type=int, default=1, help="times to run each engine for timing")
+    parser.add_argument('--baseline', help="JSON file of timing ratios to check against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown over the baseline ratio")
+    parser.add_argument('--save-baseline', help="write this run's timing ratios to a JSON file")
+    args = parser.parse_args(argv)
+
+    timings, failures = run(args.cases, args.seed, args.repeat)
+    ratios = timing_ratios(timings)
+
+    print(f"{'stage':<10} {'engine':<28} {'seconds':>10} {'ratio':>8}  relative to")
+    for (label, name), seconds in timings.items():
+        stage = reference_stage(label, timings)
+        ratio = ratios[f'{label}/{name} vs {stage}/reference']
+        print(f"{label:<10} {name:<28} {seconds:>10.4f} {ratio:>7.2f}x  {stage}/reference")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(ratios, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            failures.extend(compare_to_baseline(ratios, json.load(f), args.tolerance))
+
+    if failures:
+        print(f"\n{len(failures)} failures (seed {args.seed}):")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        return 1
+
+    print(f"\nAll engines match the reference on {args.cases} cases (seed {args.seed}).")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
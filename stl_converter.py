@@ -0,0 +1,734 @@
+"""Conversion engine shared by every Streamlit session and the batch CLI.
+
+Streamlit re-executes ``streamlit_app.py`` on every rerun, but imported
+modules are only loaded once per process. Everything expensive to build
+(compiled patterns, mapping tables, colour tables) therefore lives here at
+module level and is shared by all sessions.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+# Mapping from old tag names/types to new theme_prop names
+TAG_MAPPING = {
+    'CMResultsAdUrl_font-size': 'ad_url_font_size',
+    'CMResultsAdUrl_color': 'ad_url_font_color',
+    'CMResultsAdUrl_font-family': 'ad_url_font_family',  # Fixed: hyphen -> underscore
+    'CMResultsAdTitle_font-size': 'ad_title_font_size',
+    'CMResultsAdTitle_color': 'ad_title_color',
+    'CMResultsAdTitle_font-family': 'ad_title_font_family',
+    'CMResultsAdDescription_font-size': 'ad_desc_font_size',
+    'CMResultsAdDescription_color': 'ad_desc_font_color',
+    'CMResultsAdDescription_font-family': 'ad_desc_font_family',
+    'ResultsAdDescription_font-size': 'ad_desc_desktop_font_size',
+    'CustomResultsAdUrlBackGround_color': 'ad_background',
+    'CustomResultsAdUrlBorder_color': 'ad_border_color',
+    'CMContentArea_color': 'body_background',
+    'HeaderArea_color': 'header_background',
+    'AdBorder_color': 'cta_border_color',
+    'CMAdsLabel_color': 'cta_background',
+    'Bullet_font-size': 'cta_text_font_size',
+    'BulletText_color': 'cta_text_font_color',
+    'BulletShape_color': 'chevron_color',
+    'KeywordsHoverUnderline_checkbox': 'title_hover_underline',
+    'KeywordArea_color': 'keyword_link_color',
+    'relcontspan_font-family': 'relcont_span_font_family',
+    'HeaderText_font-size': 'header_text_font_size',
+    'HeaderText_color': 'header_text_color',
+    'HeaderText_textCase': 'header_text_case',
+    'HeaderText_tallness': 'header_border_width',
+    'HeaderText_border-style': 'header_border_style',
+    'CMResultsAdUrl_font-size_desktop': 'ad_url_desktop_font_size',
+    'CMResultsAdTitle_font-size_desktop': 'ad_title_desktop_font_size',
+    'AdBorder_color_desktop': 'cta_border_desktop_color',
+    'InnerBorder_color': 'ad_url_font_color',
+    'CallToAction_content': 'cta_text'
+}
+
+# Inverted index: new theme_prop name -> old "name_type" keys, in TAG_MAPPING order.
+# Several keys can collapse onto one prop (e.g. InnerBorder_color and
+# CMResultsAdUrl_color both map to ad_url_font_color); the first key wins
+# when no provenance is available.
+REVERSE_TAG_MAPPING = {}
+for _key, _prop_name in TAG_MAPPING.items():
+    REVERSE_TAG_MAPPING.setdefault(_prop_name, []).append(_key)
+
+# Suffixes added by rename_duplicates, most specific first
+CONTEXT_SUFFIXES = ('_desktop', '_border', '_cta_text', '_cta', '_title')
+
+# Named colors recognised by is_color_value (basic check)
+NAMED_COLORS = frozenset([
+    'red', 'blue', 'green', 'white', 'black', 'transparent',
+    'yellow', 'orange', 'purple', 'pink', 'gray', 'grey',
+    'cyan', 'magenta', 'lime', 'navy', 'maroon', 'olive',
+    'teal', 'silver', 'gold', 'brown', 'tan', 'beige'
+])
+
+# Compiled patterns, built once per process
+TAGD_NAME_FIRST_RE = re.compile(
+    r'<tagd:style\s+name=["\']([^"\']+)["\']\s+value=["\']([^"\']*)["\']\s+type=["\']([^"\']+)["\']\s*/>',
+    re.IGNORECASE
+)
+TAGD_TYPE_FIRST_RE = re.compile(
+    r'<tagd:style\s+type=["\']([^"\']+)["\']\s+name=["\']([^"\']+)["\']\s+value=["\']([^"\']*)["\']\s*/>',
+    re.IGNORECASE
+)
+THEME_PROP_RE = re.compile(r'<theme_prop:([^>\s]+)\s+default=["\']([^"\']*)["\']\s*/>')
+THEME_PROP_VALUE_RE = re.compile(r'<theme_prop:[^>\s]+\s+default=["\']([^"\']*)["\']\s*/>')
+CAMEL_CASE_RE = re.compile(r'([A-Z])')
+SELECTOR_RE = re.compile(r'\.([a-z-]+)\s*\{[^}]*$')
+CSS_PROPERTY_RE = re.compile(r'([a-z-]+):\s*<tagd:style', re.IGNORECASE)
+TAG_LINE_BREAKS_RE = re.compile(r'\s*\n\s*(<tag:[^>]+>)\s*\n\s*')
+TAG_TRAILING_BREAK_RE = re.compile(r'(<tag:[^>]+>)\s*\n\s*')
+INDEX_SUFFIX_RE = re.compile(r'_\d+$')
+PROP_NAME_RE = re.compile(r'[^>\s]+')
+HEX_COLOR_RE = re.compile(r'^#[0-9a-fA-F]{3,6}$')
+RGB_PREFIX_RE = re.compile(r'^rgba?\(', re.IGNORECASE)
+RGB_COMPONENTS_RE = re.compile(r'rgba?\((\d+),\s*(\d+),\s*(\d+)')
+
+# (pattern, replacement) pairs applied in order by replace_stl_content_tags_with_samples
+SAMPLE_SUBSTITUTIONS = [(re.compile(pattern), replacement) for pattern, replacement in [
+    # Remove conditional tags but keep their content (if:ad_present1)
+    (r'<if:([^>]+)>', ''),
+    (r'</if:([^>]+)>', ''),
+    # Replace tag:ad_annotation_enabled1 with number for class (annot1)
+    # Pattern: class="annot<tag:ad_annotation_enabled1 />" becomes class="annot1"
+    (r'<tag:ad_annotation_enabled(\d+)\s*/>', r'\1'),
+    # Replace customtag:adClickUrl1 with span element
+    (r'<customtag:adClickUrl(\d+)\s+data-type="([^"]+)"\s*/>', r'<span class="adClickUrl\1" data-type="\2" ></span>'),
+    # Replace tagd:style with type="content" - extract the value
+    (r'<tagd:style\s+name="[^"]+"\s+value="([^"]+)"\s+type="content"\s*/>', r'\1'),
+    # Remove empty/script tags
+    (r'<tag:post_form_html\s*/>', ''),
+    (r'<tag:jssource\s*/>', ''),
+    # Replace meta/title tags with sample values
+    (r'<tag:page_title\s*/>', 'Sample Page Title'),
+    (r'<tag:charset\s*/>', 'UTF-8'),
+    # Replace ad content tags with sample text (more realistic samples)
+    (r'<tag:ad_sldtld(\d+)\s*/>', r'example.com'),
+    (r'<ad_title_text:(\d+)\s*/>', r'Sample Ad Title \1'),
+    (r'<ad_desc:(\d+)\s*/>', r'This is a sample ad description for ad \1. It provides details about the product or service being advertised.'),
+    (r'<ad_href_url:(\d+)\s*/>', r'#'),
+    # Replace web/article content tags with sample text
+    (r'<web_title_text:(\d+)\s*/>', r'Sample Article Title \1'),
+    (r'<web_desc:(\d+)\s*/>', r'This is a sample article description \1. It provides a brief summary of the article content.'),
+    (r'<web_href_url:(\d+)\s*/>', r'#'),
+    # Footer links - leave empty (as shown in sample source code)
+    (r'<footer_links\s*/>', ''),
+]]
+
+# Per-session limits, configurable through the environment
+MAX_INPUT_CHARS = int(os.environ.get('STL_MAX_INPUT_CHARS', 500000))
+MAX_CPU_SECONDS = float(os.environ.get('STL_MAX_CPU_SECONDS', 5))
+
+class ResourceLimitExceeded(Exception):
+    """Raised when a single request exceeds the per-session resource limits"""
+
+def check_input_limits(input_html):
+    """Reject input over the size limit before any work is done
+
+    Conversion memory grows linearly with the input, so the size limit also
+    bounds the memory a single request can use.
+    """
+    if input_html and len(input_html) > MAX_INPUT_CHARS:
+        raise ResourceLimitExceeded(
+            f"Input is {len(input_html):,} characters; the limit is {MAX_INPUT_CHARS:,}."
+        )
+
+def cpu_deadline():
+    """Return the thread CPU time at which the current request must stop"""
+    return time.thread_time() + MAX_CPU_SECONDS
+
+def check_deadline(deadline):
+    """Raise ResourceLimitExceeded once the current thread has used up its CPU budget"""
+    if deadline is not None and time.thread_time() > deadline:
+        raise ResourceLimitExceeded(
+            f"Conversion used more than {MAX_CPU_SECONDS:g} seconds of CPU time."
+        )
+
+def theme_prop_name(name, type):
+    """Return the new theme_prop name for an old tag name and type"""
+    key = f"{name}_{type}"
+    new_prop_name = TAG_MAPPING.get(key)
+
+    # If no mapping found, create a default name
+    if not new_prop_name:
+        # Convert CamelCase to snake_case
+        new_prop_name = CAMEL_CASE_RE.sub(r'_\1', name).lower().lstrip('_').replace('__', '_') + '_' + type.lower()
+
+    return new_prop_name
+
+def theme_prop_tag(prop_name, value):
+    """Format a theme_prop tag"""
+    return f'<theme_prop:{prop_name} default="{value}" />'
+
+def convert_tag(match, name, value, type):
+    """Convert old tag format to new theme_prop format"""
+    return theme_prop_tag(theme_prop_name(name, type), value)
+
+def get_context_suffix(context_before, css_property=None):
+    """Get context suffix based on surrounding code"""
+    suffix = ""
+
+    # Check if inside media query (desktop)
+    if '@media' in context_before:
+        # Find the last @media before this tag
+        media_pos = context_before.rfind('@media')
+        if media_pos != -1:
+            # Check if there's a closing brace after @media (meaning we're still inside)
+            after_media = context_before[media_pos:]
+            open_braces = after_media.count('{')
+            close_braces = after_media.count('}')
+            if open_braces > close_braces:
+                suffix = "_desktop"
+                return suffix  # Desktop takes priority
+
+    # Check CSS property context
+    if css_property:
+        css_prop_lower = css_property.lower()
+        if 'border' in css_prop_lower and 'color' in css_prop_lower:
+            suffix = "_border"
+            return suffix  # Border color takes priority
+
+    # Check selector context (more specific selectors first)
+    selector_match = SELECTOR_RE.search(context_before)
+    if selector_match:
+        selector = selector_match.group(1)
+        if 'arrow-text' in selector:
+            suffix = "_cta_text"
+        elif 'arrow' in selector or 'cta' in selector:
+            suffix = "_cta"
+        elif 'title' in selector and 'arrow' not in selector:
+            suffix = "_title"
+
+    return suffix
+
+def find_duplicate_props(output):
+    """Find all prop names that appear more than once"""
+    matches = list(THEME_PROP_RE.finditer(output))
+
+    # Group by prop name
+    prop_groups = {}
+    for match in matches:
+        prop_name = match.group(1)
+        if prop_name not in prop_groups:
+            prop_groups[prop_name] = []
+        prop_groups[prop_name].append({
+            'match': match,
+            'value': match.group(2),
+            'position': match.start(),
+            'full_match': match.group(0)
+        })
+
+    # Return only duplicates (appears more than once)
+    duplicates = {name: occurrences for name, occurrences in prop_groups.items()
+                 if len(occurrences) > 1}
+
+    return duplicates
+
+def rename_duplicates(output, original_html, deadline=None, renames=None):
+    """Rename duplicate prop names with context suffixes
+
+    When renames is a dict, it receives {position in output: new prop name}
+    for every tag renamed.
+    """
+    duplicates = find_duplicate_props(output)
+
+    if not duplicates:
+        return output
+
+    # Find all original tags in order
+    original_tags = []
+    for match in TAGD_NAME_FIRST_RE.finditer(original_html):
+        original_tags.append({
+            'match': match,
+            'name': match.group(1),
+            'value': match.group(2),
+            'type': match.group(3),
+            'position': match.start()
+        })
+    for match in TAGD_TYPE_FIRST_RE.finditer(original_html):
+        original_tags.append({
+            'match': match,
+            'name': match.group(2),
+            'value': match.group(3),
+            'type': match.group(1),
+            'position': match.start()
+        })
+    original_tags.sort(key=lambda x: x['position'])
+
+    # Find all converted tags in order
+    converted_tags = []
+    for match in THEME_PROP_RE.finditer(output):
+        converted_tags.append({
+            'match': match,
+            'prop_name': match.group(1),
+            'value': match.group(2),
+            'position': match.start()
+        })
+    converted_tags.sort(key=lambda x: x['position'])
+    converted_index = {conv_tag['position']: idx for idx, conv_tag in enumerate(converted_tags)}
+
+    # Match converted tags to original tags by position order
+    # Process duplicates in reverse order to maintain positions
+    all_replacements = []
+    for prop_name, occurrences in duplicates.items():
+        # Keep first occurrence, rename others
+        for i, occ in enumerate(occurrences):
+            if i == 0:
+                continue  # Keep first one
+            check_deadline(deadline)
+
+            # Find this occurrence in converted_tags list
+            occ_index = converted_index.get(occ['position'])
+
+            if occ_index is not None and occ_index < len(original_tags):
+                # Get corresponding original tag
+                orig_tag = original_tags[occ_index]
+                context_start = max(0, orig_tag['position'] - 1000)
+                context_before = original_html[context_start:orig_tag['position']]
+            else:
+                # Fallback: use converted output context
+                context_start = max(0, occ['position'] - 1000)
+                context_before = output[context_start:occ['position']]
+
+            # Extract CSS property from original HTML
+            css_prop_match = CSS_PROPERTY_RE.search(context_before[-300:])
+            css_property = css_prop_match.group(1) if css_prop_match else None
+
+            # Get context suffix
+            suffix = get_context_suffix(context_before, css_property)
+
+            # If no suffix found, use index as fallback
+            if not suffix:
+                suffix = f"_{i}"
+
+            # Create new prop name
+            new_prop_name = prop_name + suffix
+            if renames is not None:
+                renames[occ['position']] = new_prop_name
+
+            # Replace this occurrence
+            old_tag = occ['full_match']
+            new_tag = old_tag.replace(f'<theme_prop:{prop_name}', f'<theme_prop:{new_prop_name}')
+            all_replacements.append((occ['position'], old_tag, new_tag))
+
+    # Sort by position (reverse order) and replace
+    all_replacements.sort(key=lambda x: x[0], reverse=True)
+    for position, old_tag, new_tag in all_replacements:
+        check_deadline(deadline)
+        output = output[:position] + new_tag + output[position + len(old_tag):]
+
+    return output
+
+def substitute_tags(pattern, html, groups, converted=None):
+    """Run one pass-1 substitution with pattern, whose (name, value, type) group numbers are groups
+
+    When converted is a list, every tag converted is appended to it as
+    (position in the returned html, match, groups, prop name, new tag), and
+    the entries already in it from an earlier pass are moved to their new
+    positions.
+    """
+    name_group, value_group, type_group = groups
+    earlier = len(converted) if converted is not None else 0
+    shift = 0
+
+    def replace(match):
+        nonlocal shift
+        prop_name = theme_prop_name(match.group(name_group), match.group(type_group))
+        new_tag = theme_prop_tag(prop_name, match.group(value_group))
+        if converted is not None:
+            converted.append((match.start() + shift, match, groups, prop_name, new_tag))
+            shift += len(new_tag) - (match.end() - match.start())
+        return new_tag
+
+    output = pattern.sub(replace, html)
+
+    if earlier and len(converted) > earlier:
+        current = converted[earlier:]
+        moved = []
+        index = 0
+        shift = 0
+        for position, match, tag_groups, prop_name, new_tag in converted[:earlier]:
+            while index < len(current) and current[index][1].start() < position:
+                shift += len(current[index][4]) - (current[index][1].end() - current[index][1].start())
+                index += 1
+            moved.append((position + shift, match, tag_groups, prop_name, new_tag))
+        converted[:] = sorted(moved + current, key=lambda x: x[0])
+
+    return output
+
+def record_provenance(provenance, original_html, output, converted, renames):
+    """Append one provenance record per theme_prop in the pass-1 output, in document order
+
+    converted comes from substitute_tags and renames from rename_duplicates,
+    both keyed by position in the pass-1 output. Tags whose generated name
+    is not a valid theme_prop name (e.g. an unmapped name with a space) get
+    prop_name None: revert_tags cannot find them, see unrecoverable_tags.
+    """
+    records = []
+    for position, match, (name_group, value_group, type_group), base_prop_name, new_tag in converted:
+        name, type = match.group(name_group, type_group)
+        start = match.start()
+        value_start, value_end = match.span(value_group)
+        if PROP_NAME_RE.fullmatch(base_prop_name):
+            prop_name = renames.get(position, base_prop_name)
+            suffix = prop_name[len(base_prop_name):]
+        else:
+            prop_name = None
+            suffix = ''
+        records.append((position, {
+            'prop_name': prop_name,
+            'suffix': suffix,
+            'name': name,
+            'type': type,
+            'original': match.group(0),
+            'converted': new_tag,
+            'value_start': value_start - start,
+            'value_end': value_end - start
+        }))
+
+    # theme_prop tags already present in the input are recorded too, so
+    # reverting leaves them alone
+    if '<theme_prop:' in original_html:
+        positions = {record[0] for record in records}
+        for match in THEME_PROP_RE.finditer(output):
+            if match.start() in positions:
+                continue
+            prop_name = renames.get(match.start(), match.group(1))
+            records.append((match.start(), {
+                'prop_name': prop_name,
+                'suffix': prop_name[len(match.group(1)):],
+                'name': None,
+                'type': None,
+                'original': match.group(0),
+                'converted': match.group(0),
+                'value_start': match.start(2) - match.start(),
+                'value_end': match.end(2) - match.start()
+            }))
+        records.sort(key=lambda x: x[0])
+
+    provenance.extend(record for _, record in records)
+
+def convert_tags(input_html, deadline=None, provenance=None):
+    """Main conversion function with two-pass approach
+
+    When provenance is a list, it receives one record per generated
+    theme_prop describing the tag it came from (see record_provenance).
+    """
+    if not input_html or not input_html.strip():
+        return ""
+
+    original_html = input_html  # Keep original for context detection
+    output = input_html
+    converted = [] if provenance is not None else None
+
+    # PASS 1: Convert <tagd:style name="..." value="..." type="..." /> to <theme_prop:... default="..." />
+    output = substitute_tags(TAGD_NAME_FIRST_RE, output, (1, 2, 3), converted)
+    check_deadline(deadline)
+
+    # Also handle tags with different attribute order
+    output = substitute_tags(TAGD_TYPE_FIRST_RE, output, (2, 3, 1), converted)
+    check_deadline(deadline)
+
+    # PASS 2: Find and rename duplicates with context suffixes
+    if provenance is not None:
+        renames = {}
+        pass_one_output = output
+        output = rename_duplicates(output, original_html, deadline, renames)
+        record_provenance(provenance, original_html, pass_one_output, converted, renames)
+    else:
+        output = rename_duplicates(output, original_html, deadline)
+
+    # Clean up: ensure tags don't have excessive line breaks around them
+    check_deadline(deadline)
+    output = TAG_LINE_BREAKS_RE.sub(r' \1 ', output)
+    check_deadline(deadline)
+    output = TAG_TRAILING_BREAK_RE.sub(r'\1 ', output)
+    check_deadline(deadline)
+
+    return output
+
+def convert_tags_with_provenance(input_html, deadline=None):
+    """Convert input_html and record where every generated theme_prop came from
+
+    Returns (output, provenance). provenance holds one record per theme_prop,
+    in output order, with the final prop name, the suffix rename_duplicates
+    added to it and the exact original tag text.
+    """
+    provenance = []
+    output = convert_tags(input_html, deadline, provenance)
+    return output, provenance
+
+def unrecoverable_tags(provenance):
+    """Return the records for converted tags that revert_tags cannot restore"""
+    return [record for record in provenance if record['prop_name'] is None]
+
+def template_fingerprint(html_content):
+    """Fingerprint Theme Smith HTML ignoring theme_prop default values
+
+    Provenance only applies to the output it was recorded for; comparing
+    fingerprints still allows the values to have been edited since.
+    """
+    skeleton = THEME_PROP_RE.sub(lambda m: f'<theme_prop:{m.group(1)} />', html_content)
+    return hashlib.sha256(skeleton.encode('utf-8')).hexdigest()
+
+def lookup_original_key(prop_name):
+    """Find the old (name, type) for a theme_prop name using the inverted index"""
+    candidates = [prop_name]
+    for suffix in CONTEXT_SUFFIXES:
+        if prop_name.endswith(suffix):
+            candidates.append(prop_name[:-len(suffix)])
+            break
+    index_match = INDEX_SUFFIX_RE.search(prop_name)
+    if index_match:
+        candidates.append(prop_name[:index_match.start()])
+
+    for candidate in candidates:
+        keys = REVERSE_TAG_MAPPING.get(candidate)
+        if keys:
+            name, type = keys[0].split('_', 1)
+            return name, type
+
+    # Unmapped names were generated as snake_case(name) + '_' + type. Only
+    # strip a suffix if what is left still has that shape.
+    for candidate in reversed(candidates):
+        snake_name, _, type = candidate.rpartition('_')
+        if snake_name.strip('_') and type:
+            return snake_to_camel(snake_name), type
+    return snake_to_camel(prop_name), ''
+
+def snake_to_camel(snake_name):
+    """Rebuild a CamelCase tag name from the snake_case part of a generated prop name"""
+    return ''.join(part[:1].upper() + part[1:] for part in snake_name.split('_'))
+
+def revert_tag(prop_name, value, record=None):
+    """Convert a theme_prop back to the old <tagd:style> format"""
+    if record:
+        original = record['original']
+        # Keep the original quoting, attribute order and case; only the value may have been edited
+        return original[:record['value_start']] + value + original[record['value_end']:]
+
+    name, type = lookup_original_key(prop_name)
+    return f'<tagd:style name="{name}" value="{value}" type="{type}" />'
+
+def revert_tags(input_html, provenance=None, deadline=None):
+    """Convert theme_prop tags back to <tagd:style> tags
+
+    With the provenance recorded by convert_tags_with_provenance every tag is
+    restored exactly, including the ones renamed by rename_duplicates.
+    Records are matched by prop name in order, so edited values and tags
+    added or removed since conversion are tolerated. Without provenance the
+    inverted TAG_MAPPING index is used and colliding props resolve to their
+    first mapping. Line breaks collapsed around <tag:...> tags by the forward
+    cleanup are not restored.
+    """
+    if not input_html or not input_html.strip():
+        return ""
+
+    records = {}
+    for record in provenance or []:
+        if record['prop_name'] is not None:
+            records.setdefault(record['prop_name'], deque()).append(record)
+    check_deadline(deadline)
+
+    def replace(match):
+        prop_name = match.group(1)
+        queue = records.get(prop_name)
+        record = queue.popleft() if queue else None
+        return revert_tag(prop_name, match.group(2), record)
+
+    return THEME_PROP_RE.sub(replace, input_html)
+
+def convert_tags_limited(input_html, provenance=None):
+    """Convert input_html, raising ResourceLimitExceeded if it breaks the per-session limits"""
+    check_input_limits(input_html)
+    return convert_tags(input_html, cpu_deadline(), provenance)
+
+def revert_tags_limited(input_html, provenance=None):
+    """Revert input_html, raising ResourceLimitExceeded if it breaks the per-session limits"""
+    check_input_limits(input_html)
+    return revert_tags(input_html, provenance, deadline=cpu_deadline())
+
+def hex_to_rgb(hex_color):
+    """Convert hex color to RGB tuple"""
+    hex_color = hex_color.lstrip("#")
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+def text_contrast_color(hex_color):
+    """Return black or white text based on hex color luminance"""
+    try:
+        r, g, b = hex_to_rgb(hex_color)
+        luminance = (0.299*r + 0.587*g + 0.114*b) / 255
+        return "black" if luminance > 0.6 else "white"
+    except:
+        return "black"
+
+def is_color_value(value):
+    """Check if value is a color (hex, rgb, etc.)"""
+    if not value:
+        return False
+
+    value = str(value).strip()
+
+    if not value:
+        return False
+
+    # Hex color: #fff, #ffffff, etc.
+    if HEX_COLOR_RE.match(value):
+        return True
+
+    # RGB/RGBA: rgb(255,255,255), rgba(255,255,255,1)
+    if RGB_PREFIX_RE.match(value):
+        return True
+
+    # Named colors (basic check)
+    if value.lower() in NAMED_COLORS:
+        return True
+
+    return False
+
+def extract_theme_props(html_content):
+    """Extract all theme_prop tags and their values"""
+    matches = THEME_PROP_RE.findall(html_content)
+
+    props = []
+    seen = set()
+    for prop_name, default_value in matches:
+        # Avoid duplicates in the list
+        key = (prop_name, default_value)
+        if key not in seen:
+            seen.add(key)
+            props.append({
+                'Property Name': prop_name,
+                'Default Value': default_value,
+                'Is Color': is_color_value(default_value)
+            })
+
+    return props
+
+def get_text_color_for_bg(bg_color):
+    """Determine text color (black or white) based on background color brightness"""
+    if not bg_color:
+        return "#000000"
+
+    bg_color = bg_color.strip()
+
+    # Handle hex colors
+    if bg_color.startswith('#'):
+        hex_color = bg_color.lstrip('#')
+        if len(hex_color) == 3:
+            hex_color = ''.join([c*2 for c in hex_color])
+
+        try:
+            r = int(hex_color[0:2], 16)
+            g = int(hex_color[2:4], 16)
+            b = int(hex_color[4:6], 16)
+
+            # Calculate brightness using relative luminance formula
+            brightness = (r * 299 + g * 587 + b * 114) / 1000
+
+            # Use white text for dark backgrounds, black for light
+            return "#ffffff" if brightness < 128 else "#000000"
+        except:
+            return "#000000"
+
+    # Handle RGB/RGBA colors
+    rgb_match = RGB_COMPONENTS_RE.match(bg_color)
+    if rgb_match:
+        try:
+            r = int(rgb_match.group(1))
+            g = int(rgb_match.group(2))
+            b = int(rgb_match.group(3))
+
+            brightness = (r * 299 + g * 587 + b * 114) / 1000
+            return "#ffffff" if brightness < 128 else "#000000"
+        except:
+            return "#000000"
+
+    # For named colors, use black text by default (most named colors are light)
+    return "#000000"
+
+def apply_prop_values(html_content, values):
+    """Set the default of every theme_prop tag named in values, in a single pass"""
+    def replace(match):
+        prop_name = match.group(1)
+        if prop_name not in values:
+            return match.group(0)
+        return f'<theme_prop:{prop_name} default="{values[prop_name]}" />'
+
+    return THEME_PROP_RE.sub(replace, html_content)
+
+def replace_theme_props_with_values(html_content):
+    """Replace theme_prop tags with their default values"""
+    if not html_content or not html_content.strip():
+        return ""
+
+    # Replace <theme_prop:... default="..." /> with just the value
+    return THEME_PROP_VALUE_RE.sub(r'\1', html_content)
+
+def replace_stl_content_tags_with_samples(html_content):
+    """Replace STL content tags with sample text for rendering, based on sample source code pattern"""
+    if not html_content or not html_content.strip():
+        return ""
+
+    output = html_content
+    for pattern, replacement in SAMPLE_SUBSTITUTIONS:
+        output = pattern.sub(replacement, output)
+
+    return output
+
+def provenance_sidecar(output, provenance):
+    """Serialise provenance with the fingerprint of the output it belongs to"""
+    return json.dumps({'fingerprint': template_fingerprint(output), 'tags': provenance}, indent=2)
+
+def load_provenance_sidecar(sidecar_json, html_content):
+    """Return the provenance in sidecar_json, or None if html_content is not the output it was recorded for"""
+    sidecar = json.loads(sidecar_json)
+    if sidecar['fingerprint'] != template_fingerprint(html_content):
+        return None
+    return sidecar['tags']
+
+def main(argv=None):
+    """Batch-convert HTML files, or revert them with --reverse"""
+    parser = argparse.ArgumentParser(description="Convert STL tags between the old and Theme Smith frameworks.")
+    parser.add_argument('files', nargs='+', type=Path, help="HTML files to convert")
+    parser.add_argument('-o', '--output-dir', type=Path, required=True, help="directory for converted files")
+    parser.add_argument('--reverse', action='store_true', help="convert theme_prop tags back to tagd:style")
+    args = parser.parse_args(argv)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    status = 0
+    for path in args.files:
+        target = args.output_dir / path.name
+        if target.resolve() == path.resolve():
+            print(f"{path}: output would overwrite the input, choose another --output-dir", file=sys.stderr)
+            status = 1
+            continue
+        html = path.read_text(encoding='utf-8')
+        # Provenance is kept next to the converted file so --reverse can restore it exactly
+        provenance_path = path.with_name(path.name + '.provenance.json')
+        if args.reverse:
+            provenance = None
+            if provenance_path.exists():
+                provenance = load_provenance_sidecar(provenance_path.read_text(encoding='utf-8'), html)
+                if provenance is None:
+                    print(f"{path}: changed since conversion, ignoring {provenance_path.name}", file=sys.stderr)
+            target.write_text(revert_tags(html, provenance), encoding='utf-8')
+        else:
+            output, provenance = convert_tags_with_provenance(html)
+            target.write_text(output, encoding='utf-8')
+            (args.output_dir / provenance_path.name).write_text(provenance_sidecar(output, provenance), encoding='utf-8')
+            for record in unrecoverable_tags(provenance):
+                print(f"{path}: cannot be reverted exactly: {record['original']}", file=sys.stderr)
+        print(f"{path} -> {target}")
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())